@@ -1,6 +1,6 @@
 import requests
 import googlemaps
-from flask import Flask, request
+from flask import Flask, request, g, has_request_context, jsonify
 from flask_restx import Resource, Api, fields, reqparse, abort, marshal, marshal_with
 from configparser import ConfigParser
 import psycopg2 as pg
@@ -9,12 +9,30 @@ from healthcheck import HealthCheck, EnvironmentDump
 from prometheus_flask_exporter import PrometheusMetrics, RESTfulPrometheusMetrics
 from fluent import sender, handler
 import logging
-from time import time
+from time import time, perf_counter
 import json
 import os
+import threading
+import cProfile
+import pstats
+import io
+import random
+import hmac
+from collections import deque
+from contextlib import contextmanager
 import socket
 from datetime import datetime
 import consul
+from prostor import (
+    ProstorskiIndeks,
+    celica_mreze,
+    intervali_celic,
+    napaka_kroga,
+    napaka_pravokotnika,
+    pravokotniki_okoli,
+    razdalja_km,
+    razdeli_pravokotnik,
+)
 
 app = Flask(__name__)
 
@@ -75,6 +93,139 @@ l.info(
     },
 )
 
+# Profiliranje na zahtevo: glava X-Profil ali nakljucno vzorcenje z verjetnostjo
+# PROFIL_VZORCENJE. Casi SQL poizvedb in zunanjih klicev se merijo vedno (za
+# dnevnik pocasnih poizvedb), razponi in cProfile pa le za profilirane zahteve.
+# Glava X-Profil in /aktivni_prevozi/profili zahtevata PROFIL_ZETON; prazen
+# zeton (privzeto) ju onemogoci.
+PROFIL_GLAVA = "X-Profil"
+PROFIL_ZETON = str(app.config["PROFIL_ZETON"])
+PROFIL_VZORCENJE = float(app.config["PROFIL_VZORCENJE"])
+PRAGOVI_MS = {
+    "sql": float(app.config["POCASNA_POIZVEDBA_MS"]),
+    "http": float(app.config["POCASEN_KLIC_MS"]),
+}
+profili = deque(maxlen=int(app.config["PROFIL_SHRANI"]))
+profili_lock = threading.Lock()
+
+
+def veljaven_profil_zeton():
+    zeton = request.headers.get(PROFIL_GLAVA)
+    if not PROFIL_ZETON or not zeton:
+        return False
+    return hmac.compare_digest(zeton.encode(), PROFIL_ZETON.encode())
+
+
+def opis_razpona(deli):
+    return " ".join(" ".join(str(d) for d in deli).split())[:500]
+
+
+@contextmanager
+def casovni_razpon(vrsta, *deli):
+    # Opis (npr. besedilo SQL) se sestavi le, ce je razpon zabelezen ali pocasen
+    zacetek = perf_counter()
+    try:
+        yield
+    finally:
+        trajanje_ms = (perf_counter() - zacetek) * 1000
+        profil = g.get("profil") if has_request_context() else None
+        if profil is not None:
+            profil["razponi"].append(
+                {
+                    "vrsta": vrsta,
+                    "opis": opis_razpona(deli),
+                    "zacetek_ms": round((zacetek - profil["zacetek"]) * 1000, 3),
+                    "trajanje_ms": round(trajanje_ms, 3),
+                }
+            )
+        if trajanje_ms > PRAGOVI_MS[vrsta]:
+            l.warning(
+                "Pocasen %s (%.1f ms): %s" % (vrsta, trajanje_ms, opis_razpona(deli)),
+                extra={
+                    "name_of_service": "Aktivni prevozi",
+                    "crud_method": request.method.lower() if has_request_context() else None,
+                    "directions": "out",
+                    "ip_node": socket.gethostbyname(socket.gethostname()),
+                    "status": "slow",
+                    "http_code": None,
+                },
+            )
+
+
+class MerjeniKurzor(extensions.cursor):
+    def execute(self, query, vars=None):
+        with casovni_razpon("sql", query):
+            return super(MerjeniKurzor, self).execute(query, vars)
+
+
+def zunanji_klic(metoda, url, **kwargs):
+    with casovni_razpon("http", metoda.upper(), url):
+        return requests.request(metoda, url, **kwargs)
+
+
+@app.before_request
+def zacni_profil():
+    if request.path == "/aktivni_prevozi/profili":
+        return
+    if (
+        PROFIL_VZORCENJE <= 0 or random.random() >= PROFIL_VZORCENJE
+    ) and not veljaven_profil_zeton():
+        return
+    g.profil = {"zacetek": perf_counter(), "razponi": [], "profiler": cProfile.Profile()}
+    try:
+        g.profil["profiler"].enable()
+    except ValueError:
+        # Drug profiler ze tece (npr. v drugi niti na Python >= 3.12)
+        g.profil["profiler"] = None
+
+
+@app.after_request
+def koncaj_profil(response):
+    profil = g.pop("profil", None)
+    if profil is None:
+        return response
+    trajanje_ms = (perf_counter() - profil["zacetek"]) * 1000
+    statistika = None
+    if profil["profiler"] is not None:
+        profil["profiler"].disable()
+        izhod = io.StringIO()
+        pstats.Stats(profil["profiler"], stream=izhod).sort_stats("cumulative").print_stats(30)
+        statistika = izhod.getvalue()
+    with profili_lock:
+        profili.append(
+            {
+                "cas": datetime.utcnow().isoformat() + "Z",
+                "metoda": request.method,
+                "pot": request.full_path.rstrip("?"),
+                "status": response.status_code,
+                "trajanje_ms": round(trajanje_ms, 3),
+                "razponi": profil["razponi"],
+                "profil": statistika,
+            }
+        )
+    return response
+
+
+@app.teardown_request
+def ustavi_profil(exc):
+    # Neobravnavana izjema preskoci after_request; profiler ne sme ostati vklopljen
+    profil = g.pop("profil", None)
+    if profil is not None and profil["profiler"] is not None:
+        profil["profiler"].disable()
+
+
+@app.route("/aktivni_prevozi/profili")
+def vrni_profile():
+    if not PROFIL_ZETON:
+        abort(404)
+    if not veljaven_profil_zeton():
+        abort(403, "Manjka ali napacen zeton v glavi %s" % PROFIL_GLAVA)
+    n = request.args.get("n", default=10, type=int)
+    with profili_lock:
+        zadnji = list(profili)[-n:] if n > 0 else []
+    return jsonify({"profili": zadnji[::-1]}), 200
+
+
 api = Api(
     app,
     version="1.0",
@@ -104,6 +255,8 @@ prevozApiModel = api.model(
         "odpremljeno": fields.String(readonly=True, description="Odpremljeno"),
         "prejeto": fields.String(readonly=True, description="Prejeto"),
         "strosek": fields.Integer(readonly=True, description="Strosek prevoza"),
+        "lat": fields.Float(readonly=True, description="Geografska sirina trenutne lokacije"),
+        "lng": fields.Float(readonly=True, description="Geografska dolzina trenutne lokacije"),
     },
 )
 prevoziApiModel = api.model(
@@ -144,9 +297,138 @@ def connect_to_database():
         password=app.config["PGPASSWORD"],
         port=app.config["DATABASE_PORT"],
         host=app.config["DATABASE_IP"],
+        cursor_factory=MerjeniKurzor,
     )
 
 
+tabela_pripravljena = False
+tabela_lock = threading.Lock()
+
+
+def pripravi_tabelo(conn, cur, table_name):
+    """
+    Pripravi shemo enkrat na proces; obicajno ob zagonu, sicer ob prvi zahtevi
+    """
+    global tabela_pripravljena
+    if tabela_pripravljena:
+        return
+    with tabela_lock:
+        if tabela_pripravljena:
+            return
+        ustvari_shemo(conn, cur, table_name)
+        tabela_pripravljena = True
+
+
+def pripravi_tabelo_ob_zagonu():
+    # Dopolnitev koordinat lahko traja (geocoding), zato tece pred prvo zahtevo
+    conn = None
+    try:
+        conn = connect_to_database()
+        pripravi_tabelo(conn, conn.cursor(), "aktivni_prevozi")
+    except pg.Error as e:
+        print("Tabele ob zagonu ni bilo mogoce pripraviti, poskus ob prvi zahtevi: {0}".format(e))
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def ustvari_shemo(conn, cur, table_name):
+    cur.execute(
+        "select exists(select * from information_schema.tables where table_name=%s)",
+        (table_name,),
+    )
+    koordinate = []
+    if cur.fetchone()[0]:
+        print("Table {0} already exists".format(table_name))
+        cur.execute(
+            "select exists(select * from information_schema.columns where table_name=%s and column_name='celica')",
+            (table_name,),
+        )
+        if not cur.fetchone()[0]:
+            # Enkratna dopolnitev koordinat obstojecih prevozov. Lokacije se
+            # razresijo pred ALTER TABLE in izven transakcije, da geocoding
+            # ne drzi zaklepa tabele.
+            cur.execute("SELECT id_prevoza, trenutna_lokacija FROM aktivni_prevozi")
+            obstojece = cur.fetchall()
+            conn.commit()
+            for id_prevoza, lokacija in obstojece:
+                lat, lng = pridobi_koordinate(lokacija.strip() if lokacija else None)
+                if lat is not None:
+                    koordinate.append((lat, lng, celica_mreze(lat, lng), id_prevoza))
+            print(
+                "Dopolnjene koordinate {0} od {1} prevozov".format(
+                    len(koordinate), len(obstojece)
+                )
+            )
+    else:
+        cur.execute(
+            """CREATE TABLE aktivni_prevozi (
+                       id_prevoza INT NOT NULL,
+                       prevoznik INT NOT NULL,
+                       uporabnik_prevoza INT NOT NULL,
+                       od_lokacije CHAR(20),
+                       do_lokacije CHAR(20),
+                       cas_odhoda CHAR(20),
+                       cas_prihoda CHAR(20),
+                       trenutna_lokacija CHAR(20),
+                       odpremljeno CHAR(20),
+                       prejeto CHAR(20),
+                       status CHAR(20),
+                       strosek INT
+                    )"""
+        )
+    # Koordinate trenutne lokacije in celica mreze (B-tree indeks, brez PostGIS).
+    # ALTER TABLE zaklene tabelo, zato se shema pripravi le enkrat na proces.
+    # Stolpci so dodani na konec tabele, da se SELECT * še vedno ujema s prevoziPolja.
+    cur.execute(
+        """ALTER TABLE aktivni_prevozi
+               ADD COLUMN IF NOT EXISTS lat DOUBLE PRECISION,
+               ADD COLUMN IF NOT EXISTS lng DOUBLE PRECISION,
+               ADD COLUMN IF NOT EXISTS celica BIGINT"""
+    )
+    if koordinate:
+        cur.executemany(
+            "UPDATE aktivni_prevozi SET lat = %s, lng = %s, celica = %s WHERE id_prevoza = %s",
+            koordinate,
+        )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS aktivni_prevozi_celica_idx ON aktivni_prevozi (celica)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS aktivni_prevozi_id_idx ON aktivni_prevozi (id_prevoza)"
+    )
+    conn.commit()
+
+
+def pridobi_koordinate(lokacija):
+    """
+    Pretvori lokacijo v koordinate; sprejme "lat,lng" ali naslov (Google geocoding)
+    """
+    if lokacija is None:
+        return None, None
+    try:
+        lat, lng = (float(x) for x in lokacija.split(","))
+        if -90 <= lat <= 90 and -180 <= lng <= 180:
+            # 180° in -180° sta isti poldnevnik; mreza uporablja -180°
+            return lat, (-180.0 if lng == 180 else lng)
+    except ValueError:
+        pass
+    try:
+        with casovni_razpon("http", "geocode", lokacija):
+            rezultat = gmaps.geocode(lokacija)
+    except Exception:
+        return None, None
+    if not rezultat:
+        return None, None
+    tocka = rezultat[0]["geometry"]["location"]
+    return tocka["lat"], tocka["lng"]
+
+
+# Indeks v pomnilniku se vzdrzuje le, ce ga poizvedbe tudi uporabljajo
+INDEKS_V_POMNILNIKU = app.config["PROSTORSKI_INDEKS"] == "pomnilnik"
+prostorski_indeks = ProstorskiIndeks()
+
+
 prevoziPolja = {
     "id_prevoza": fields.Integer,
     "prevoznik": fields.Integer,
@@ -160,6 +442,9 @@ prevoziPolja = {
     "prejeto": fields.String,
     "status": fields.String,
     "strosek": fields.Integer,
+    "lat": fields.Float,
+    "lng": fields.Float,
+    "celica": fields.Integer,
 }
 
 
@@ -178,6 +463,8 @@ class PrevozModel:
         prejeto,
         status,
         strosek,
+        lat=None,
+        lng=None,
     ):
         self.id_prevoza = id_prevoza
         self.prevoznik = prevoznik
@@ -191,6 +478,8 @@ class PrevozModel:
         self.prejeto = prejeto
         self.status = status
         self.strosek = strosek
+        self.lat = lat
+        self.lng = lng
 
 
 class Prevoz(Resource):
@@ -202,29 +491,7 @@ class Prevoz(Resource):
         self.iskani = app.config["ISKALCI_IP"]
         self.conn = connect_to_database()
         self.cur = self.conn.cursor()
-        self.cur.execute(
-            "select exists(select * from information_schema.tables where table_name=%s)",
-            (self.table_name,),
-        )
-        if self.cur.fetchone()[0]:
-            print("Table {0} already exists".format(self.table_name))
-        else:
-            self.cur.execute(
-                """CREATE TABLE aktivni_prevozi (
-                           id_prevoza INT NOT NULL,
-                           prevoznik INT NOT NULL,
-                           uporabnik_prevoza INT NOT NULL,
-                           od_lokacije CHAR(20),
-                           do_lokacije CHAR(20),
-                           cas_odhoda CHAR(20),
-                           cas_prihoda CHAR(20),
-                           trenutna_lokacija CHAR(20),
-                           odpremljeno CHAR(20),
-                           prejeto CHAR(20),
-                           status CHAR(20),
-                           strosek INT
-                        )"""
-            )
+        pripravi_tabelo(self.conn, self.cur, self.table_name)
 
         self.parser = reqparse.RequestParser()
         self.parser.add_argument(
@@ -304,6 +571,8 @@ class Prevoz(Resource):
             prejeto=d["prejeto"].strip(),
             status=d["status"].strip(),
             strosek=d["strosek"],
+            lat=d["lat"],
+            lng=d["lng"],
         )
 
         l.info(
@@ -344,11 +613,22 @@ class Prevoz(Resource):
         attribute = args["atribut"]  # uporabnik_prevoza
         value = args["vrednost"]  # id
 
+        # Geocoding je zunanji klic, zato se koordinate razresijo pred pisanjem,
+        # da transakcija ne drzi zaklepa vrstice med klicem
+        if attribute == "trenutna_lokacija":
+            lat, lng = pridobi_koordinate(value)
+            celica = celica_mreze(lat, lng) if lat is not None else None
+
         self.cur.execute(
             """UPDATE {0} SET {1} = '{2}' WHERE id_prevoza = {3}""".format(
                 self.table_name, attribute, value, id
             )
         )
+        if attribute == "trenutna_lokacija":
+            self.cur.execute(
+                "UPDATE aktivni_prevozi SET lat = %s, lng = %s, celica = %s WHERE id_prevoza = %s",
+                (lat, lng, celica, id),
+            )
         self.conn.commit()
 
         self.cur.execute(
@@ -373,6 +653,8 @@ class Prevoz(Resource):
         d = {}
         for el, k in zip(row[0], prevoziPolja):
             d[k] = el
+        if attribute == "trenutna_lokacija" and INDEKS_V_POMNILNIKU:
+            prostorski_indeks.posodobi(id, d["lat"], d["lng"])
         prevoz = PrevozModel(
             id_prevoza=d["id_prevoza"],
             prevoznik=d["prevoznik"],
@@ -386,6 +668,8 @@ class Prevoz(Resource):
             prejeto=d["prejeto"].strip(),
             status=d["status"].strip(),
             strosek=d["strosek"],
+            lat=d["lat"],
+            lng=d["lng"],
         )
 
         # Posodobi transakcijo
@@ -444,6 +728,8 @@ class Prevoz(Resource):
                 "DELETE FROM aktivni_prevozi WHERE id_prevoza = %s" % str(id)
             )
             self.conn.commit()
+            if INDEKS_V_POMNILNIKU:
+                prostorski_indeks.odstrani(id)
 
         l.info(
             "Aktivni prevoz z ID %s izbrisan" % str(id),
@@ -469,29 +755,7 @@ class ListPrevozov(Resource):
         self.iskani = app.config["ISKALCI_IP"]
         self.conn = connect_to_database()
         self.cur = self.conn.cursor()
-        self.cur.execute(
-            "select exists(select * from information_schema.tables where table_name=%s)",
-            (self.table_name,),
-        )
-        if self.cur.fetchone()[0]:
-            print("Table {0} already exists".format(self.table_name))
-        else:
-            self.cur.execute(
-                """CREATE TABLE aktivni_prevozi (
-                           id_prevoza INT NOT NULL,
-                           prevoznik INT NOT NULL,
-                           uporabnik_prevoza INT NOT NULL,
-                           od_lokacije CHAR(20),
-                           do_lokacije CHAR(20),
-                           cas_odhoda CHAR(20),
-                           cas_prihoda CHAR(20),
-                           trenutna_lokacija CHAR(20),
-                           odpremljeno CHAR(20),
-                           prejeto CHAR(20),
-                           status CHAR(20),
-                           strosek INT
-                        )"""
-            )
+        pripravi_tabelo(self.conn, self.cur, self.table_name)
         self.parser = reqparse.RequestParser()
         self.parser.add_argument(
             "id_prevoza",
@@ -554,6 +818,8 @@ class ListPrevozov(Resource):
                 prejeto=ds[d]["prejeto"].strip(),
                 status=ds[d]["status"].strip(),
                 strosek=ds[d]["strosek"],
+                lat=ds[d]["lat"],
+                lng=ds[d]["lng"],
             )
             prevozi.append(prevoz)
 
@@ -594,7 +860,7 @@ class ListPrevozov(Resource):
 
         id = args["uporabnik_prevoza"]
         # Preveri če prevoznik obstaja
-        resp = requests.get(self.uporabniki + "/narocniki/%s" % str(id))
+        resp = zunanji_klic("get", self.uporabniki + "/narocniki/%s" % str(id))
         if resp.status_code != 200:
             l.warning("Uporabnik z ID %s ni bil najden" % str(id), extra={"name_of_service": "Aktivni prevozi", "crud_method": "post", "directions": "out", "ip_node": socket.gethostbyname(socket.gethostname()), "status": "fail", "http_code": 410})
             abort(410, "Ta uporabnik ne obstaja!")
@@ -623,7 +889,7 @@ class ListPrevozov(Resource):
             l.warning('Zahteva za aktivni prevoz mora biti ali "iskani" ali "ponujeni"', extra={"name_of_service": "Aktivni prevozi", "crud_method": "post", "directions": "out", "ip_node": socket.gethostbyname(socket.gethostname()), "status": "fail", "http_code": 408})
             abort(408)
 
-        resp = requests.get(vir)
+        resp = zunanji_klic("get", vir)
         if resp.status_code != 200:
             l.warning(
                 "Aktivni prevoz z ID %s ni bil najden" % str(args["id_prevoza"]),
@@ -638,12 +904,15 @@ class ListPrevozov(Resource):
             )
             abort(404)
         pd = resp.json()
-        requests.delete(vir)  # Zbrisi prevoz iz tam kjer je prisel
+        zunanji_klic("delete", vir)  # Zbrisi prevoz iz tam kjer je prisel
+
+        lat, lng = pridobi_koordinate(pd["od_lokacije"])
+        celica = celica_mreze(lat, lng) if lat is not None else None
 
         self.cur.execute(
-            """INSERT INTO {0} (id_prevoza, prevoznik, uporabnik_prevoza, od_lokacije, do_lokacije, cas_odhoda, cas_prihoda, trenutna_lokacija, odpremljeno, prejeto, status, strosek)
-                VALUES ({1}, {2}, {3}, '{4}', '{5}', '{6}', '{7}', '{8}', '{9}', '{10}', '{11}', '{12}')""".format(
-                "aktivni_prevozi",
+            """INSERT INTO aktivni_prevozi (id_prevoza, prevoznik, uporabnik_prevoza, od_lokacije, do_lokacije, cas_odhoda, cas_prihoda, trenutna_lokacija, odpremljeno, prejeto, status, strosek, lat, lng, celica)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+            (
                 pd["id_prevoza"],
                 pd["prevoznik"],
                 args["uporabnik_prevoza"],
@@ -656,9 +925,14 @@ class ListPrevozov(Resource):
                 "Ne",
                 "V teku",
                 pd["strosek"],
-            )
+                lat,
+                lng,
+                celica,
+            ),
         )
         self.conn.commit()
+        if INDEKS_V_POMNILNIKU:
+            prostorski_indeks.posodobi(pd["id_prevoza"], lat, lng)
         prevoz = PrevozModel(
             id_prevoza=pd["id_prevoza"],
             uporabnik_prevoza=pd["uporabnik_prevoza"],
@@ -672,6 +946,8 @@ class ListPrevozov(Resource):
             prejeto="Ne",
             status=pd["status"],
             strosek=pd["strosek"],
+            lat=lat,
+            lng=lng,
         )
 
         # Ustvari transakcijo
@@ -690,6 +966,166 @@ class ListPrevozov(Resource):
         return prevoz, 201
 
 
+class BliznjiPrevozi(Resource):
+    def __init__(self, *args, **kwargs):
+        self.table_name = "aktivni_prevozi"
+        self.conn = connect_to_database()
+        self.cur = self.conn.cursor()
+        pripravi_tabelo(self.conn, self.cur, self.table_name)
+        self.parser = reqparse.RequestParser()
+        self.parser.add_argument("lat", type=float, location="args", help="Geografska sirina sredisca")
+        self.parser.add_argument("lng", type=float, location="args", help="Geografska dolzina sredisca")
+        self.parser.add_argument("razdalja", type=float, location="args", help="Polmer iskanja v km")
+        self.parser.add_argument("min_lat", type=float, location="args")
+        self.parser.add_argument("min_lng", type=float, location="args")
+        self.parser.add_argument("max_lat", type=float, location="args")
+        self.parser.add_argument("max_lng", type=float, location="args")
+
+        super(BliznjiPrevozi, self).__init__(*args, **kwargs)
+
+    def poisci_v_bazi(self, pravokotniki):
+        pogoji = []
+        parametri = []
+        for min_lat, min_lng, max_lat, max_lng in pravokotniki:
+            intervali = intervali_celic(min_lat, min_lng, max_lat, max_lng)
+            if not intervali:
+                continue
+            pogoji.append(
+                "(({0}) AND lat BETWEEN %s AND %s AND lng BETWEEN %s AND %s)".format(
+                    " OR ".join(["celica BETWEEN %s AND %s"] * len(intervali))
+                )
+            )
+            parametri += [meja for interval in intervali for meja in interval]
+            parametri += [min_lat, max_lat, min_lng, max_lng]
+        if not pogoji:
+            return []
+        self.cur.execute(
+            "SELECT * FROM aktivni_prevozi WHERE " + " OR ".join(pogoji), parametri
+        )
+        return self.cur.fetchall()
+
+    def poisci_v_pomnilniku(self, pravokotniki):
+        prostorski_indeks.nalozi(self.cur)
+        ids = set()
+        for pravokotnik in pravokotniki:
+            ids.update(prostorski_indeks.poisci(*pravokotnik))
+        if len(ids) == 0:
+            return []
+        self.cur.execute(
+            "SELECT * FROM aktivni_prevozi WHERE id_prevoza = ANY(%s)", (list(ids),)
+        )
+        return self.cur.fetchall()
+
+    @ns.marshal_list_with(prevoziApiModel)
+    @ns.response(400, "Manjkajoce ali neveljavne koordinate iskanja")
+    @ns.doc(
+        "Vrni bliznje prevoze",
+        params={
+            "lat": "Geografska sirina sredisca",
+            "lng": "Geografska dolzina sredisca",
+            "razdalja": "Polmer iskanja v km",
+            "min_lat": "Juzna meja pravokotnika",
+            "min_lng": "Zahodna meja pravokotnika",
+            "max_lat": "Severna meja pravokotnika",
+            "max_lng": "Vzhodna meja pravokotnika",
+        },
+    )
+    def get(self):
+        """
+        Vrni aktivne prevoze v polmeru okoli tocke ali znotraj pravokotnika
+        """
+        l.info(
+            "Zahtevaj bliznje aktivne prevoze",
+            extra={
+                "name_of_service": "Aktivni prevozi",
+                "crud_method": "get",
+                "directions": "in",
+                "ip_node": socket.gethostbyname(socket.gethostname()),
+                "status": None,
+                "http_code": None,
+            },
+        )
+
+        args = self.parser.parse_args()
+        sredisce = None
+        if None not in (args["lat"], args["lng"], args["razdalja"]):
+            sredisce = (args["lat"], args["lng"], args["razdalja"])
+            napaka = napaka_kroga(*sredisce)
+        elif None not in (args["min_lat"], args["min_lng"], args["max_lat"], args["max_lng"]):
+            pravokotnik = (args["min_lat"], args["min_lng"], args["max_lat"], args["max_lng"])
+            napaka = napaka_pravokotnika(*pravokotnik)
+        else:
+            napaka = "Podaj lat, lng in razdalja ali min_lat, min_lng, max_lat in max_lng"
+        if napaka is not None:
+            l.warning(
+                "Neveljavna zahteva za bliznje prevoze: %s" % napaka,
+                extra={
+                    "name_of_service": "Aktivni prevozi",
+                    "crud_method": "get",
+                    "directions": "out",
+                    "ip_node": socket.gethostbyname(socket.gethostname()),
+                    "status": "fail",
+                    "http_code": 400,
+                },
+            )
+            abort(400, napaka)
+
+        if sredisce is not None:
+            pravokotniki = pravokotniki_okoli(*sredisce)
+        else:
+            # min_lng > max_lng pomeni pravokotnik cez ±180°
+            pravokotniki = razdeli_pravokotnik(*pravokotnik)
+
+        if INDEKS_V_POMNILNIKU:
+            rows = self.poisci_v_pomnilniku(pravokotniki)
+        else:
+            rows = self.poisci_v_bazi(pravokotniki)
+
+        prevozi = []
+        for row in rows:
+            d = {}
+            for el, k in zip(row, prevoziPolja):
+                d[k] = el
+            if sredisce is not None:
+                oddaljenost = razdalja_km(sredisce[0], sredisce[1], d["lat"], d["lng"])
+                if oddaljenost > sredisce[2]:
+                    continue
+            else:
+                oddaljenost = 0
+            prevoz = PrevozModel(
+                id_prevoza=d["id_prevoza"],
+                prevoznik=d["prevoznik"],
+                uporabnik_prevoza=d["uporabnik_prevoza"],
+                od_lokacije=d["od_lokacije"].strip(),
+                do_lokacije=d["do_lokacije"].strip(),
+                cas_odhoda=d["cas_odhoda"].strip(),
+                cas_prihoda=d["cas_prihoda"].strip(),
+                trenutna_lokacija=d["trenutna_lokacija"].strip(),
+                odpremljeno=d["odpremljeno"].strip(),
+                prejeto=d["prejeto"].strip(),
+                status=d["status"].strip(),
+                strosek=d["strosek"],
+                lat=d["lat"],
+                lng=d["lng"],
+            )
+            prevozi.append((oddaljenost, prevoz))
+        prevozi.sort(key=lambda p: p[0])
+
+        l.info(
+            "Vrni bliznje aktivne prevoze",
+            extra={
+                "name_of_service": "Aktivni prevozi",
+                "crud_method": "get",
+                "directions": "out",
+                "ip_node": socket.gethostbyname(socket.gethostname()),
+                "status": "success",
+                "http_code": 200,
+            },
+        )
+
+        return {"prevozi": [p for _, p in prevozi]}, 200
+
+
 health = HealthCheck()
 envdump = EnvironmentDump()
 health.add_check(check_database_connection)
@@ -698,5 +1134,7 @@ app.add_url_rule("/healthcheck", "healthcheck", view_func=lambda: health.run())
 app.add_url_rule("/environment", "environment", view_func=lambda: envdump.run())
 api.add_resource(ListPrevozov, "/aktivni_prevozi")
 api.add_resource(Prevoz, "/aktivni_prevozi/<int:id>")
+api.add_resource(BliznjiPrevozi, "/aktivni_prevozi/blizu")
+pripravi_tabelo_ob_zagonu()
 app.run(host="0.0.0.0", port=5011)
 h.close()
@@ -0,0 +1,430 @@
+"""
+Obremenitveni test Aktivni prevozi API
+
+Zazene nadomestke zunanjih storitev (stubs.py), napolni tabelo
+aktivni_prevozi v lokalni bazi Postgres, zazene api.py in ga obremeni z
+mesanico GET/PUT/POST/DELETE zahtev. Za vsako koncno tocko zapise p50/p95/p99
+zakasnitev in prepustnost v JSON datoteko. Z --baseline primerja rezultat s
+prejsnjim zagonom in vrne izhodno kodo 1 ob regresiji p95 ali vecjem delezu
+napak ter 2, ce se konfiguracija zagona razlikuje od baseline.
+
+POZOR: tabela aktivni_prevozi v --pg-database se na zacetku izbrise.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import psycopg2 as pg
+import requests
+from psycopg2.extras import execute_values
+
+from stubs import StubServers, koordinate_prevoza
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from prostor import celica_mreze  # noqa: E402
+
+# api.py vedno poslusa na vratih 5011
+APP_PORT = 5011
+APP_URL = "http://127.0.0.1:%d" % APP_PORT
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Obremenitveni test Aktivni prevozi API")
+    parser.add_argument("--rows", type=int, default=1000, help="velikost tabele")
+    parser.add_argument("--requests", type=int, default=2000, help="stevilo merjenih zahtev")
+    parser.add_argument("--warmup", type=int, default=100, help="stevilo nemerjenih zahtev")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--mix",
+        default="get=40,list=5,blizu=10,put=25,post=10,delete=10",
+        help="utezi operacij get, list, blizu, put, post, delete",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="JSON rezultat prejsnjega zagona za primerjavo")
+    parser.add_argument(
+        "--threshold", type=float, default=1.2, help="dovoljeno razmerje p95 proti baseline"
+    )
+    parser.add_argument("--pg-host", default="127.0.0.1")
+    parser.add_argument("--pg-port", default="5432")
+    parser.add_argument("--pg-user", default="postgres")
+    parser.add_argument("--pg-password", default="postgres")
+    parser.add_argument("--pg-database", default="paketiorg_bench")
+    parser.add_argument("--app-log", default=os.devnull)
+    return parser.parse_args()
+
+
+def parse_mix(mix):
+    utezi = {}
+    for del_ in mix.split(","):
+        ime, utez = del_.split("=")
+        utezi[ime.strip()] = float(utez)
+    neznane = set(utezi) - set(OPERACIJE)
+    if neznane:
+        raise SystemExit("Neznane operacije: %s" % ", ".join(sorted(neznane)))
+    if utezi.get("delete") and not utezi.get("post"):
+        raise SystemExit("Operacija delete potrebuje post, ki ustvarja prevoze za brisanje")
+    return utezi
+
+
+def napolni_bazo(args, rows):
+    conn = pg.connect(
+        database=args.pg_database,
+        user=args.pg_user,
+        password=args.pg_password,
+        port=args.pg_port,
+        host=args.pg_host,
+    )
+    cur = conn.cursor()
+    cur.execute("TRUNCATE aktivni_prevozi")
+    vrstice = []
+    for i in range(1, rows + 1):
+        lat, lng = koordinate_prevoza(i)
+        lokacija = "%.4f,%.4f" % (lat, lng)
+        vrstice.append(
+            (i, 1, 1, lokacija, "46.0569,14.5058", "08:00", "09:00", lokacija,
+             "Ne", "Ne", "V teku", 10, lat, lng, celica_mreze(lat, lng))
+        )
+    execute_values(
+        cur,
+        """INSERT INTO aktivni_prevozi (id_prevoza, prevoznik, uporabnik_prevoza, od_lokacije, do_lokacije, cas_odhoda, cas_prihoda, trenutna_lokacija, odpremljeno, prejeto, status, strosek, lat, lng, celica)
+           VALUES %s""",
+        vrstice,
+    )
+    cur.execute("ANALYZE aktivni_prevozi")
+    conn.commit()
+    conn.close()
+
+
+def pobrisi_tabelo(args):
+    conn = pg.connect(
+        database=args.pg_database,
+        user=args.pg_user,
+        password=args.pg_password,
+        port=args.pg_port,
+        host=args.pg_host,
+    )
+    conn.cursor().execute("DROP TABLE IF EXISTS aktivni_prevozi")
+    conn.commit()
+    conn.close()
+
+
+def preveri_prosta_vrata():
+    # Ze zagnan streznik bi odgovoril namesto nasega procesa, ta pa bi se
+    # koncal z "address in use"; zato prekinemo, preden se tabela izbrise
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        if s.connect_ex(("127.0.0.1", APP_PORT)) == 0:
+            raise SystemExit(
+                "Vrata %d so ze zasedena; ustavi drug api.py pred obremenitvenim testom"
+                % APP_PORT
+            )
+
+
+def zazeni_aplikacijo(args, stub_config, log):
+    env = dict(os.environ)
+    env.update(stub_config)
+    env.update(
+        {
+            "DATABASE_IP": args.pg_host,
+            "DATABASE_PORT": str(args.pg_port),
+            "PGDATABASE": args.pg_database,
+            "PGUSER": args.pg_user,
+            "PGPASSWORD": args.pg_password,
+        }
+    )
+    proces = subprocess.Popen(
+        [sys.executable, "api.py"], cwd=REPO, env=env, stdout=log, stderr=log
+    )
+    rok = time.time() + 30
+    while time.time() < rok:
+        if proces.poll() is not None:
+            raise SystemExit("api.py se je koncal z izhodno kodo %d" % proces.returncode)
+        try:
+            if requests.get(APP_URL + "/", timeout=1).status_code == 200:
+                # Odgovor steje le, ce nas proces se tece (vrata niso zasedena)
+                time.sleep(0.5)
+                if proces.poll() is None:
+                    return proces
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    proces.terminate()
+    raise SystemExit("api.py se ni zagnal v 30 s")
+
+
+class Workload:
+    """
+    Stanje obremenitve: obstojeci ID-ji in ID-ji, dodani s POST
+    """
+
+    def __init__(self, rows, seed):
+        self.rows = rows
+        self.naslednji_id = itertools.count(rows + 1)
+        self.dodani = deque()
+        self.lokalno = threading.local()
+        self.seed = seed
+        self.seed_lock = threading.Lock()
+        self.seed_stevec = itertools.count()
+
+    def rng(self):
+        if not hasattr(self.lokalno, "rng"):
+            with self.seed_lock:
+                self.lokalno.rng = random.Random(self.seed * 1000 + next(self.seed_stevec))
+            self.lokalno.session = requests.Session()
+        return self.lokalno.rng
+
+    def session(self):
+        self.rng()
+        return self.lokalno.session
+
+    def nakljucni_id(self):
+        return self.rng().randint(1, self.rows)
+
+
+def op_get(w):
+    return w.session().get(APP_URL + "/aktivni_prevozi/%d" % w.nakljucni_id())
+
+
+def op_list(w):
+    return w.session().get(APP_URL + "/aktivni_prevozi")
+
+
+def op_blizu(w):
+    lat, lng = koordinate_prevoza(w.nakljucni_id())
+    return w.session().get(
+        APP_URL + "/aktivni_prevozi/blizu",
+        params={"lat": lat, "lng": lng, "razdalja": 10},
+    )
+
+
+def op_put(w):
+    rng = w.rng()
+    if rng.random() < 0.8:
+        lat, lng = koordinate_prevoza(rng.randint(1, 10 ** 6))
+        telo = {"atribut": "trenutna_lokacija", "vrednost": "%.4f,%.4f" % (lat, lng)}
+    else:
+        telo = {"atribut": "status", "vrednost": rng.choice(["V teku", "Dostavljeno"])}
+    return w.session().put(
+        APP_URL + "/aktivni_prevozi/%d" % w.nakljucni_id(), json=telo
+    )
+
+
+def op_post(w):
+    id_prevoza = next(w.naslednji_id)
+    resp = w.session().post(
+        APP_URL + "/aktivni_prevozi",
+        json={
+            "id_prevoza": id_prevoza,
+            "vir": w.rng().choice(["ponujeni", "iskani"]),
+            "uporabnik_prevoza": 1,
+        },
+    )
+    if resp.status_code < 400:
+        w.dodani.append(id_prevoza)
+    return resp
+
+
+def op_delete(w):
+    # Brise le prevoze, dodane s POST, da velikost tabele ostane stabilna
+    try:
+        id_prevoza = w.dodani.popleft()
+    except IndexError:
+        return None
+    return w.session().delete(APP_URL + "/aktivni_prevozi/%d" % id_prevoza)
+
+
+OPERACIJE = {
+    "get": ("GET /aktivni_prevozi/<id>", op_get),
+    "list": ("GET /aktivni_prevozi", op_list),
+    "blizu": ("GET /aktivni_prevozi/blizu", op_blizu),
+    "put": ("PUT /aktivni_prevozi/<id>", op_put),
+    "post": ("POST /aktivni_prevozi", op_post),
+    "delete": ("DELETE /aktivni_prevozi/<id>", op_delete),
+}
+
+
+def izvedi(pool, w, utezi, stevilo, rezultati):
+    """
+    Izvedi stevilo zahtev in vrni trajanje v sekundah
+    """
+    imena = list(utezi)
+    teze = [utezi[i] for i in imena]
+    zaklep = threading.Lock()
+
+    def ena_zahteva(_):
+        rng = w.rng()
+        while True:
+            koncna_tocka, op = OPERACIJE[rng.choices(imena, teze)[0]]
+            zacetek = time.perf_counter()
+            try:
+                resp = op(w)
+            except requests.RequestException:
+                napaka = True
+                break
+            if resp is not None:
+                napaka = resp.status_code >= 400
+                break
+        trajanje = time.perf_counter() - zacetek
+        with zaklep:
+            r = rezultati.setdefault(koncna_tocka, {"latence": [], "napake": 0})
+            r["latence"].append(trajanje)
+            r["napake"] += napaka
+
+    zacetek = time.perf_counter()
+    list(pool.map(ena_zahteva, range(stevilo)))
+    return time.perf_counter() - zacetek
+
+
+def percentil(urejene, p):
+    # Metoda najblizjega ranga
+    if not urejene:
+        return None
+    k = max(0, int(-(-p * len(urejene) // 100)) - 1)
+    return urejene[k]
+
+
+def povzetek(rezultati, trajanje):
+    izhod = {}
+    for koncna_tocka, r in sorted(rezultati.items()):
+        urejene = sorted(r["latence"])
+        izhod[koncna_tocka] = {
+            "requests": len(urejene),
+            "errors": r["napake"],
+            "throughput_rps": len(urejene) / trajanje,
+            "mean_ms": 1000 * sum(urejene) / len(urejene),
+            "p50_ms": 1000 * percentil(urejene, 50),
+            "p95_ms": 1000 * percentil(urejene, 95),
+            "p99_ms": 1000 * percentil(urejene, 99),
+        }
+    return izhod
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=REPO, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def delez_napak(r):
+    return r["errors"] / r["requests"] if r["requests"] else 0.0
+
+
+def primerjaj(rezultat, baseline, threshold):
+    """
+    Izpisi primerjavo z baseline in vrni True ob regresiji p95 ali napak
+    """
+    regresija = False
+    print(
+        "%-32s %12s %12s %8s %10s %10s"
+        % ("endpoint", "base p95 ms", "p95 ms", "ratio", "base err%", "err%")
+    )
+    for koncna_tocka, b in baseline["endpoints"].items():
+        if koncna_tocka not in rezultat["endpoints"]:
+            regresija = True
+            print("%-32s  MISSING" % koncna_tocka)
+    for koncna_tocka, r in rezultat["endpoints"].items():
+        b = baseline["endpoints"].get(koncna_tocka)
+        if b is None:
+            print("%-32s %12s %12.2f %8s" % (koncna_tocka, "-", r["p95_ms"], "-"))
+            continue
+        razmerje = r["p95_ms"] / b["p95_ms"] if b["p95_ms"] else float("inf")
+        oznake = []
+        if razmerje > threshold:
+            oznake.append("REGRESSION")
+        # Hitre napake (npr. 500 v 2 ms) bi sicer izgledale kot izboljsava
+        if delez_napak(r) > delez_napak(b):
+            oznake.append("ERRORS")
+        regresija = regresija or bool(oznake)
+        print(
+            "%-32s %12.2f %12.2f %8.2f %10.2f %10.2f%s"
+            % (
+                koncna_tocka,
+                b["p95_ms"],
+                r["p95_ms"],
+                razmerje,
+                100 * delez_napak(b),
+                100 * delez_napak(r),
+                "  " + " ".join(oznake) if oznake else "",
+            )
+        )
+    return regresija
+
+
+def main():
+    args = parse_args()
+    utezi = parse_mix(args.mix)
+    konfiguracija = {
+        "rows": args.rows,
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "concurrency": args.concurrency,
+        "mix": utezi,
+        "seed": args.seed,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        # Primerjava razlicnih obremenitev nima pomena, zato se zavrne takoj
+        if baseline["config"] != konfiguracija:
+            print("Konfiguracija se razlikuje od baseline:")
+            print("  baseline: %s" % json.dumps(baseline["config"], sort_keys=True))
+            print("  trenutna: %s" % json.dumps(konfiguracija, sort_keys=True))
+            sys.exit(2)
+    w = Workload(args.rows, args.seed)
+
+    preveri_prosta_vrata()
+    stubi = StubServers()
+    stub_config = stubi.start()
+    pobrisi_tabelo(args)
+    log = open(args.app_log, "w")
+    proces = zazeni_aplikacijo(args, stub_config, log)
+    try:
+        # Prva zahteva ustvari tabelo, nato jo napolnimo
+        requests.get(APP_URL + "/aktivni_prevozi")
+        napolni_bazo(args, args.rows)
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            izvedi(pool, w, utezi, args.warmup, {})
+            rezultati = {}
+            trajanje = izvedi(pool, w, utezi, args.requests, rezultati)
+    finally:
+        proces.terminate()
+        proces.wait()
+        log.close()
+        stubi.stop()
+
+    rezultat = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "git_commit": git_commit(),
+        "config": konfiguracija,
+        "duration_s": trajanje,
+        "throughput_rps": args.requests / trajanje,
+        "endpoints": povzetek(rezultati, trajanje),
+    }
+    with open(args.output, "w") as f:
+        json.dump(rezultat, f, indent=2)
+    print("Rezultati zapisani v %s" % args.output)
+
+    if baseline is not None:
+        if primerjaj(rezultat, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
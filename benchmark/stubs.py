@@ -0,0 +1,118 @@
+"""
+Lokalni nadomestki zunanjih storitev za obremenitveno testiranje
+
+Streznik uporabnikov, ponujenih in iskanih prevozov, Consul KV ter Fluent
+(TCP ponor). Vsi tecejo v lastni niti na nakljucnih vratih na localhost.
+"""
+import base64
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import BaseRequestHandler, ThreadingTCPServer
+
+
+def koordinate_prevoza(id_prevoza):
+    # Deterministicne koordinate v Sloveniji, da so rezultati ponovljivi
+    lat = 45.45 + (id_prevoza * 7919 % 14000) / 10000.0
+    lng = 13.40 + (id_prevoza * 104729 % 31000) / 10000.0
+    return lat, lng
+
+
+def prevoz_stub(id_prevoza):
+    lat, lng = koordinate_prevoza(id_prevoza)
+    return {
+        "id_prevoza": id_prevoza,
+        "prevoznik": 1,
+        "uporabnik_prevoza": 1,
+        "od_lokacije": "%.4f,%.4f" % (lat, lng),
+        "do_lokacije": "46.0569,14.5058",
+        "cas_odhoda": "08:00",
+        "cas_prihoda": "09:00",
+        "status": "V teku",
+        "strosek": 10,
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def deli_poti(self):
+        return [d for d in self.path.split("?")[0].split("/") if d]
+
+    def poslji(self, koda, telo=None, glave=None):
+        data = b"" if telo is None else json.dumps(telo).encode()
+        self.send_response(koda)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (glave or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        deli = self.deli_poti()
+        if len(deli) == 2 and deli[0] == "narocniki":
+            self.poslji(200, {"id": int(deli[1])})
+        elif len(deli) == 2 and deli[0] in ("ponujeni_prevozi", "iskani_prevozi"):
+            self.poslji(200, prevoz_stub(int(deli[1])))
+        elif deli[:2] == ["v1", "kv"]:
+            kljuc = "/".join(deli[2:])
+            vrednost = base64.b64encode(b"OK").decode()
+            self.poslji(
+                200,
+                [{"Key": kljuc, "Value": vrednost, "Flags": 0, "ModifyIndex": 1}],
+                {"X-Consul-Index": "1"},
+            )
+        else:
+            self.poslji(404, {})
+
+    def do_DELETE(self):
+        self.poslji(204)
+
+
+class FluentHandler(BaseRequestHandler):
+    def handle(self):
+        while self.request.recv(65536):
+            pass
+
+
+class StubServers:
+    """
+    Zazene vse nadomestke in vrne konfiguracijo za aplikacijo
+    """
+
+    def __init__(self, host="127.0.0.1"):
+        self.host = host
+        self.strezniki = []
+
+    def _zazeni(self, streznik):
+        streznik.daemon_threads = True
+        nit = threading.Thread(target=streznik.serve_forever, daemon=True)
+        nit.start()
+        self.strezniki.append(streznik)
+        return streznik.server_address[1]
+
+    def start(self):
+        http_port = self._zazeni(ThreadingHTTPServer((self.host, 0), StubHandler))
+        ThreadingTCPServer.allow_reuse_address = True
+        fluent_port = self._zazeni(ThreadingTCPServer((self.host, 0), FluentHandler))
+        url = "http://%s:%d/" % (self.host, http_port)
+        return {
+            "UPORABNIKI_IP": url,
+            "PLACILA_IP": url,
+            "VOZNIKI_IP": url,
+            "ISKALCI_IP": url,
+            "CONSUL_IP": self.host,
+            "CONSUL_PORT": str(http_port),
+            "FLUENT_IP": self.host,
+            "FLUENT_PORT": str(fluent_port),
+        }
+
+    def stop(self):
+        for streznik in self.strezniki:
+            streznik.shutdown()
+            streznik.server_close()
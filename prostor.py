@@ -0,0 +1,183 @@
+import math
+import threading
+
+# Mreza celic velikosti VELIKOST_CELICE stopinj (~1.1 km v smeri sever-jug).
+# Celica je oštevilčena po vrsticah, zato je vsaka vrstica celic en zvezen
+# interval vrednosti in poizvedba po pravokotniku potrebuje le en interval
+# na vrstico. Sprememba velikosti zahteva ponoven izracun stolpca celica.
+VELIKOST_CELICE = 0.01
+STOLPCI_MREZE = int(round(360 / VELIKOST_CELICE))
+NAJVEC_VRSTIC_POIZVEDBE = 200
+POLMER_ZEMLJE_KM = 6371.0
+
+
+def celica_mreze(lat, lng):
+    vrstica = int(math.floor((lat + 90) / VELIKOST_CELICE))
+    stolpec = int(math.floor((lng + 180) / VELIKOST_CELICE)) % STOLPCI_MREZE
+    return vrstica * STOLPCI_MREZE + stolpec
+
+
+def intervali_celic(min_lat, min_lng, max_lat, max_lng):
+    """
+    Vrni intervale (od, do) celic, ki pokrivajo pravokotnik
+    """
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lng, max_lng = max(min_lng, -180.0), min(max_lng, 180.0 - 1e-9)
+    prva = celica_mreze(min_lat, min_lng)
+    zadnja = celica_mreze(max_lat, max_lng)
+    prva_vrstica, prvi_stolpec = divmod(prva, STOLPCI_MREZE)
+    zadnja_vrstica, zadnji_stolpec = divmod(zadnja, STOLPCI_MREZE)
+    if zadnja_vrstica - prva_vrstica >= NAJVEC_VRSTIC_POIZVEDBE:
+        # Zelo velik pravokotnik: en interval cez celoten pas vrstic
+        return [(prva, zadnja)]
+    return [
+        (v * STOLPCI_MREZE + prvi_stolpec, v * STOLPCI_MREZE + zadnji_stolpec)
+        for v in range(prva_vrstica, zadnja_vrstica + 1)
+    ]
+
+
+def napaka_kroga(lat, lng, razdalja):
+    """
+    Vrni opis napake ali None, ce so parametri iskanja v polmeru veljavni
+    """
+    # Primerjave z NaN so vedno neresnicne, zato NaN ne prestane preverjanj
+    if not -90 <= lat <= 90:
+        return "lat mora biti med -90 in 90"
+    if not math.isfinite(lng):
+        return "lng mora biti koncno stevilo"
+    if not (math.isfinite(razdalja) and razdalja >= 0):
+        return "razdalja mora biti nenegativno koncno stevilo"
+    return None
+
+
+def napaka_pravokotnika(min_lat, min_lng, max_lat, max_lng):
+    """
+    Vrni opis napake ali None, ce je pravokotnik veljaven
+    """
+    if not (-90 <= min_lat <= 90 and -90 <= max_lat <= 90):
+        return "min_lat in max_lat morata biti med -90 in 90"
+    if min_lat > max_lat:
+        return "min_lat ne sme biti vecji od max_lat"
+    if not (math.isfinite(min_lng) and math.isfinite(max_lng)):
+        return "min_lng in max_lng morata biti koncni stevili"
+    return None
+
+
+def razdeli_pravokotnik(min_lat, min_lng, max_lat, max_lng):
+    """
+    Vrni seznam pravokotnikov z dolzinami v [-180, 180]; pravokotnik, ki
+    precka ±180° (ali ima min_lng > max_lng), se razdeli na dva
+    """
+    if max_lng < min_lng:
+        max_lng += 360
+    if max_lng - min_lng >= 360:
+        return [(min_lat, -180.0, max_lat, 180.0)]
+    zamik = math.floor((min_lng + 180) / 360) * 360
+    min_lng, max_lng = min_lng - zamik, max_lng - zamik
+    if max_lng <= 180:
+        return [(min_lat, min_lng, max_lat, max_lng)]
+    return [
+        (min_lat, min_lng, max_lat, 180.0),
+        (min_lat, -180.0, max_lat, max_lng - 360),
+    ]
+
+
+def pravokotniki_okoli(lat, lng, razdalja_km):
+    """
+    Vrni pravokotnike, ki skupaj vsebujejo celoten krog s polmerom razdalja_km
+    """
+    d = razdalja_km / POLMER_ZEMLJE_KM
+    min_lat = lat - math.degrees(d)
+    max_lat = lat + math.degrees(d)
+    if max_lat >= 90 or min_lat <= -90:
+        # Krog vsebuje pol, zato pokrije vse dolzine
+        return [(max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0)]
+    # Najvecji odmik dolzine je na dotikalni tocki, ne na sirini sredisca
+    d_lng = math.degrees(math.asin(math.sin(d) / math.cos(math.radians(lat))))
+    return razdeli_pravokotnik(min_lat, lng - d_lng, max_lat, lng + d_lng)
+
+
+def razdalja_km(lat1, lng1, lat2, lng2):
+    f1, f2 = math.radians(lat1), math.radians(lat2)
+    df = f2 - f1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(df / 2) ** 2 + math.cos(f1) * math.cos(f2) * math.sin(dl / 2) ** 2
+    return 2 * POLMER_ZEMLJE_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class ProstorskiIndeks:
+    """
+    Mrezni indeks trenutnih lokacij v pomnilniku (za sledenje v zivo)
+
+    Indeks je lokalen za proces in se posodablja le ob zahtevah, ki jih ta
+    proces obdela; ob vec replikah so spremembe drugih replik nevidne.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.celice = {}
+        self.prevozi = {}
+        self.nalozen = False
+
+    def nalozi(self, cur):
+        """
+        Nalozi indeks iz baze, ce se ni nalozen
+        """
+        if self.nalozen:
+            return
+        # Branje poteka pod zaklepom: posodobitev, ki se zgodi med nalaganjem,
+        # pocaka in se uveljavi po njem, zato je ne prepise zastarela vrstica
+        with self.lock:
+            if self.nalozen:
+                return
+            cur.execute(
+                "SELECT id_prevoza, lat, lng FROM aktivni_prevozi WHERE celica IS NOT NULL"
+            )
+            self.celice = {}
+            self.prevozi = {}
+            for id_prevoza, lat, lng in cur.fetchall():
+                self._dodaj(id_prevoza, lat, lng)
+            self.nalozen = True
+
+    def _dodaj(self, id_prevoza, lat, lng):
+        celica = celica_mreze(lat, lng)
+        self.prevozi[id_prevoza] = (lat, lng, celica)
+        self.celice.setdefault(celica, set()).add(id_prevoza)
+
+    def _odstrani(self, id_prevoza):
+        stari = self.prevozi.pop(id_prevoza, None)
+        if stari is None:
+            return
+        ids = self.celice.get(stari[2])
+        if ids is not None:
+            ids.discard(id_prevoza)
+            if not ids:
+                del self.celice[stari[2]]
+
+    def posodobi(self, id_prevoza, lat, lng):
+        with self.lock:
+            self._odstrani(id_prevoza)
+            if lat is not None and lng is not None:
+                self._dodaj(id_prevoza, lat, lng)
+
+    def odstrani(self, id_prevoza):
+        with self.lock:
+            self._odstrani(id_prevoza)
+
+    def poisci(self, min_lat, min_lng, max_lat, max_lng):
+        """
+        Vrni {id_prevoza: (lat, lng)} za prevoze znotraj pravokotnika
+        """
+        najdeni = {}
+        with self.lock:
+            for od, do in intervali_celic(min_lat, min_lng, max_lat, max_lng):
+                if do - od + 1 > len(self.celice):
+                    kandidati = (c for c in self.celice if od <= c <= do)
+                else:
+                    kandidati = (c for c in range(od, do + 1) if c in self.celice)
+                for celica in kandidati:
+                    for id_prevoza in self.celice[celica]:
+                        lat, lng, _ = self.prevozi[id_prevoza]
+                        if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng:
+                            najdeni[id_prevoza] = (lat, lng)
+        return najdeni
@@ -0,0 +1,190 @@
+import math
+import random
+import threading
+
+import pytest
+
+from prostor import (
+    STOLPCI_MREZE,
+    ProstorskiIndeks,
+    celica_mreze,
+    intervali_celic,
+    napaka_kroga,
+    napaka_pravokotnika,
+    pravokotniki_okoli,
+    razdalja_km,
+    razdeli_pravokotnik,
+)
+
+
+def v_pravokotnikih(pravokotniki, lat, lng):
+    return any(
+        min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+        for min_lat, min_lng, max_lat, max_lng in pravokotniki
+    )
+
+
+def tocka_na_razdalji(lat, lng, razdalja, smer):
+    # Koncna tocka po glavnem krogu (smer v radianih od severa)
+    d = razdalja / 6371.0
+    f1, l1 = math.radians(lat), math.radians(lng)
+    f2 = math.asin(math.sin(f1) * math.cos(d) + math.cos(f1) * math.sin(d) * math.cos(smer))
+    l2 = l1 + math.atan2(
+        math.sin(smer) * math.sin(d) * math.cos(f1), math.cos(d) - math.sin(f1) * math.sin(f2)
+    )
+    lng2 = (math.degrees(l2) + 180) % 360 - 180
+    return math.degrees(f2), lng2
+
+
+def test_celica_mreze_po_vrsticah():
+    assert celica_mreze(-90, -180) == 0
+    assert celica_mreze(-90, -179.995) == 0
+    assert celica_mreze(-90, -179.985) == 1
+    assert celica_mreze(-89.985, -180) == STOLPCI_MREZE
+    assert celica_mreze(0, 180) == celica_mreze(0, -180)
+
+
+def test_intervali_pokrijejo_tocke_v_pravokotniku():
+    rng = random.Random(1)
+    for _ in range(200):
+        min_lat, min_lng = rng.uniform(-80, 70), rng.uniform(-180, 170)
+        max_lat, max_lng = min_lat + rng.uniform(0, 3), min_lng + rng.uniform(0, 3)
+        intervali = intervali_celic(min_lat, min_lng, max_lat, max_lng)
+        for _ in range(20):
+            lat, lng = rng.uniform(min_lat, max_lat), rng.uniform(min_lng, min(max_lng, 179.99))
+            c = celica_mreze(lat, lng)
+            assert any(od <= c <= do for od, do in intervali)
+
+
+@pytest.mark.parametrize("lat", [0, 46, 60, 80, 89])
+@pytest.mark.parametrize("razdalja", [1, 10, 300, 2000])
+def test_pravokotnik_vsebuje_krog(lat, razdalja):
+    pravokotniki = pravokotniki_okoli(lat, 14.5, razdalja)
+    for i in range(360):
+        t = tocka_na_razdalji(lat, 14.5, razdalja * 0.999999, math.radians(i))
+        assert v_pravokotnikih(pravokotniki, *t)
+
+
+def test_krog_s_polom_pokrije_vse_dolzine():
+    assert pravokotniki_okoli(89.9, 10, 50) == [(pytest.approx(89.45, abs=0.01), -180.0, 90.0, 180.0)]
+    assert pravokotniki_okoli(-89.9, 10, 50)[0][1:4:2] == (-180.0, 180.0)
+
+
+def test_razdeli_pravokotnik_cez_datumsko_mejo():
+    assert razdeli_pravokotnik(0, 10, 1, 20) == [(0, 10, 1, 20)]
+    assert razdeli_pravokotnik(0, 170, 1, 190) == [(0, 170, 1, 180.0), (0, -180.0, 1, -170)]
+    assert razdeli_pravokotnik(0, -190, 1, -170) == [(0, 170, 1, 180.0), (0, -180.0, 1, -170)]
+    assert razdeli_pravokotnik(0, 179, 1, -179) == [(0, 179, 1, 180.0), (0, -180.0, 1, -179)]
+    assert razdeli_pravokotnik(0, -200, 1, 200) == [(0, -180.0, 1, 180.0)]
+
+
+def test_krog_cez_datumsko_mejo():
+    pravokotniki = pravokotniki_okoli(0, -179.99, 10)
+    assert len(pravokotniki) == 2
+    assert v_pravokotnikih(pravokotniki, 0, 179.99)
+
+
+@pytest.mark.parametrize(
+    "lat, lng, razdalja",
+    [(100, 14.5, 1), (-91, 14.5, 1), (math.nan, 14.5, 1), (46, math.nan, 1),
+     (46, math.inf, 1), (46, 14.5, -5), (46, 14.5, math.nan), (46, 14.5, math.inf)],
+)
+def test_napaka_kroga(lat, lng, razdalja):
+    assert napaka_kroga(lat, lng, razdalja) is not None
+
+
+def test_veljaven_krog():
+    assert napaka_kroga(46, 14.5, 0) is None
+    assert napaka_kroga(90, -180, 10) is None
+
+
+@pytest.mark.parametrize(
+    "pravokotnik",
+    [(47, 14, 46, 15), (-91, 14, 46, 15), (46, 14, 91, 15), (math.nan, 14, 46, 15),
+     (46, math.nan, 47, 15), (46, 14, 47, math.inf)],
+)
+def test_napaka_pravokotnika(pravokotnik):
+    assert napaka_pravokotnika(*pravokotnik) is not None
+
+
+def test_veljaven_pravokotnik_ima_intervale():
+    for pravokotnik in [(46, 14, 47, 15), (46, 179, 47, -179), (-90, -180, 90, 180), (46, 14, 46, 14)]:
+        assert napaka_pravokotnika(*pravokotnik) is None
+        for del_ in razdeli_pravokotnik(*pravokotnik):
+            assert intervali_celic(*del_)
+
+
+def poisci_v_krogu(indeks, lat, lng, razdalja):
+    najdeni = {}
+    for pravokotnik in pravokotniki_okoli(lat, lng, razdalja):
+        najdeni.update(indeks.poisci(*pravokotnik))
+    return {i for i, t in najdeni.items() if razdalja_km(lat, lng, *t) <= razdalja}
+
+
+def test_indeks_enak_kot_polno_preiskovanje():
+    rng = random.Random(2)
+    tocke = {i: (rng.uniform(-89, 89), rng.uniform(-180, 180)) for i in range(20000)}
+    indeks = ProstorskiIndeks()
+    for i, (lat, lng) in tocke.items():
+        indeks.posodobi(i, lat, lng)
+    for _ in range(300):
+        i = rng.randrange(len(tocke))
+        lat, lng = tocke[i]
+        razdalja = rng.choice([10, 100, 300, 1000, 3000])
+        pricakovani = {
+            j for j, t in tocke.items() if razdalja_km(lat, lng, *t) <= razdalja
+        }
+        assert poisci_v_krogu(indeks, lat, lng, razdalja) == pricakovani
+
+
+def test_indeks_posodobi_in_odstrani():
+    indeks = ProstorskiIndeks()
+    indeks.posodobi(1, 46.05, 14.5)
+    assert poisci_v_krogu(indeks, 46.05, 14.5, 1) == {1}
+    indeks.posodobi(1, 46.55, 15.6)
+    assert poisci_v_krogu(indeks, 46.05, 14.5, 1) == set()
+    assert poisci_v_krogu(indeks, 46.55, 15.6, 1) == {1}
+    indeks.odstrani(1)
+    assert indeks.celice == {} and indeks.prevozi == {}
+
+
+class FakeCursor:
+    def __init__(self, rows, med_branjem=None):
+        self.rows = rows
+        self.med_branjem = med_branjem
+        self.branja = 0
+
+    def execute(self, query, vars=None):
+        self.branja += 1
+
+    def fetchall(self):
+        if self.med_branjem is not None:
+            self.med_branjem()
+        return self.rows
+
+
+def test_nalozi_samo_enkrat():
+    indeks = ProstorskiIndeks()
+    cur = FakeCursor([(1, 46.05, 14.5)])
+    niti = [threading.Thread(target=indeks.nalozi, args=(cur,)) for _ in range(8)]
+    for nit in niti:
+        nit.start()
+    for nit in niti:
+        nit.join()
+    assert cur.branja == 1
+    assert indeks.prevozi[1][:2] == (46.05, 14.5)
+
+
+def test_posodobitev_med_nalaganjem_ni_prepisana():
+    indeks = ProstorskiIndeks()
+    posodobitev = threading.Thread(target=indeks.posodobi, args=(1, 46.55, 15.6))
+
+    def med_branjem():
+        posodobitev.start()
+        posodobitev.join(0.1)
+        # Posodobitev caka na zaklep, dokler nalaganje ne konca
+        assert posodobitev.is_alive()
+
+    indeks.nalozi(FakeCursor([(1, 46.05, 14.5)], med_branjem))
+    posodobitev.join()
+    assert indeks.prevozi[1][:2] == (46.55, 15.6)